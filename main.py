@@ -1,25 +1,95 @@
+import csv
+import io
 import os
+import queue
+import re
 import sys
 import hashlib
 import json
-import shutil
-import webbrowser
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import wraps
+from html import escape as _html_escape
 from urllib.parse import quote
 
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk, TclError
-
 try:
-    from PIL import Image, ExifTags
+    import orjson
 except Exception:
-    Image = None
-    ExifTags = None
+    orjson = None
+
+# tkinter、Pillow 与 requests 体积较大，首次用到时再导入，缩短启动时间
+tk = None
+ttk = None
+filedialog = None
+messagebox = None
+TclError = None
+Image = None
+ExifTags = None
+requests = None
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _load_tk() -> bool:
+    """按需导入 tkinter，返回是否可用；缺少 Tcl/Tk 时由调用方降级到命令行模式"""
+    global tk, ttk, filedialog, messagebox, TclError, _TK_UTF16_INDEX
+    if tk is None:
+        try:
+            import tkinter as _tk
+            from tkinter import filedialog as _filedialog, messagebox as _messagebox, ttk as _ttk
+        except Exception:
+            return False
+        ttk, filedialog, messagebox, TclError = _ttk, _filedialog, _messagebox, _tk.TclError
+        _TK_UTF16_INDEX = _tk.TclVersion < 8.7
+        tk = _tk
+    return True
+
+
+def _pil() -> bool:
+    """按需导入 Pillow，返回是否可用"""
+    global Image, ExifTags
+    if Image is None:
+        try:
+            from PIL import Image as _Image, ExifTags as _ExifTags
+        except Exception:
+            return False
+        ExifTags = _ExifTags
+        Image = _Image
+    return True
+
+
+def _session():
+    """按需导入 requests 并返回全局复用的 HTTP 会话；requests 未安装时返回 None"""
+    global requests, _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                try:
+                    import requests as _requests
+                except Exception:
+                    return None
+                requests = _requests
+                _SESSION = _build_session()
+    return _SESSION
+
+
+def _build_session():
+    """构建全局复用的 HTTP 会话：连接池 + 重试策略，避免每次请求重新握手"""
+    try:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util import Retry
+        session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    except Exception:
+        return requests  # 回退为直接使用 requests
 
-try:
-    import requests
-except Exception:
-    requests = None
 
 APP_TITLE = "图片时间与证据生成器（测试版）"
 APP_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -28,57 +98,318 @@ OUTPUT_DIR = os.path.join(APP_DIR, "evidence_packages")
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# 快速指纹只读取文件开头的字节数
+FINGERPRINT_BYTES = 256 * 1024
+
+# 预览缩略图尺寸与缓存条数
+PREVIEW_SIZE = (640, 360)
+THUMB_CACHE_SIZE = 8
+
+# 日志区超过 LOG_TRIM_AT 行时只保留最近 LOG_KEEP_LINES 行
+LOG_TRIM_AT = 2500
+LOG_KEEP_LINES = 2000
+
+# EXIF 字段数量上限，超出视为异常数据并截断
+EXIF_MAX_TAGS = 4096
+# 报告只保留与取证相关的 EXIF 字段，单个值过长时截断（如 MakerNote 等二进制块）
+EXIF_WHITELIST = {
+    "DateTimeOriginal", "DateTime", "CreateDate", "Make", "Model", "GPSInfo", "Orientation",
+    "ExifImageWidth", "ExifImageHeight", "LensModel", "FNumber", "ExposureTime",
+    "ISOSpeedRatings", "FocalLength",
+}
+EXIF_VALUE_MAX_LEN = 256
+# 可能携带 EXIF 的格式；其余格式（PNG/BMP 等）直接跳过，不经过 Pillow
+EXIF_EXTS = {".jpg", ".jpeg", ".tif", ".tiff", ".heic", ".heif"}
+# EXIF 解析结果缓存条数，按 (路径, 大小, 修改时间) 区分文件版本
+EXIF_CACHE_SIZE = 32
+
+# Markdown 预览用正则（模块加载时编译一次）
+_RE_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_RE_ITALIC = re.compile(r"(?<!\*)\*(.+?)\*(?!\*)|_(.+?)_")
+_RE_CODE = re.compile(r"`([^`]+)`")
+_RE_LINK = re.compile(r"\[([^\]]+)\]\(([^\)]+)\)")
+
+# Tcl/Tk 8.6 内部以 UTF-16 计数，BMP 以外的字符（如 emoji）在 Text 索引中占两个字符位置
+# 在 _load_tk() 中按实际 Tcl 版本设置
+_TK_UTF16_INDEX = True
+
+
+def _tk_col(line: str, i: int) -> int:
+    """将 Python 字符串偏移换算为 Tk Text 的列号"""
+    if not _TK_UTF16_INDEX or line.isascii():
+        return i
+    return i + sum(1 for ch in line[:i] if ch > "\uffff")
+
+
+# 网络请求结果缓存：(函数名, 参数) -> (获取时刻, 结果)
+_NET_CACHE = {}
+# 股票行情缓存秒数（逐个与合并请求共用）
+STOCK_CACHE_TTL = 60
+
+
+def _net_cache_get(key, seconds: float):
+    """取 seconds 秒内的缓存结果（返回副本），没有或已过期返回 None"""
+    ent = _NET_CACHE.get(key)
+    if ent and time.monotonic() - ent[0] < seconds:
+        return dict(ent[1])
+    return None
+
+
+def _net_cache_put(key, res: dict) -> None:
+    """缓存结果副本；出错的结果不缓存"""
+    if "error" not in res:
+        _NET_CACHE[key] = (time.monotonic(), dict(res))
+
+
+def ttl_cache(seconds: float):
+    """短时缓存网络查询结果，seconds 秒内的重复调用直接返回内存结果；出错的结果不缓存"""
+    def deco(fn):
+        @wraps(fn)
+        def wrap(*args):
+            key = (fn.__name__, args)
+            res = _net_cache_get(key, seconds)
+            if res is None:
+                res = fn(*args)
+                _net_cache_put(key, res)
+            return res
+        return wrap
+    return deco
+
+
+_log_ts_cache = (-1, "")
+
+
+def _log_timestamp() -> str:
+    """日志时间戳，同一秒内复用已格式化的字符串"""
+    global _log_ts_cache
+    sec = int(time.time())
+    if sec != _log_ts_cache[0]:
+        _log_ts_cache = (sec, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sec)))
+    return _log_ts_cache[1]
+
+
+def esc(s: str) -> str:
+    """HTML 转义（& < >），使用标准库的 C 实现；非字符串值先转为 str"""
+    return _html_escape(str(s) if s else "", quote=False)
+
+
+# 报告表格行模板
+_EXIF_ROW = "<tr><td>{}</td><td>{}</td></tr>"
+_STOCK_ROW = "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td><a href='{}' target='_blank'>数据源</a></td></tr>"
+_MD_EXIF_ROW = "| {} | {} |\n"
+_MD_STOCK_ROW = "| {} | {} | {} | {} | {} | [数据源]({}) |\n"
+_MD_CHECK_ROW = "| {} | {} | {} | {} | {} | {} | {} |\n"
+
 
 def safe_filename(name: str) -> str:
     return "".join(c for c in name if c.isalnum() or c in ("-", "_", ".")).strip()
 
 
 def sha256_file(path: str) -> str:
+    with open(path, 'rb', buffering=0) as f:
+        if sys.version_info >= (3, 11):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        # 旧版本 Python：复用 1 MiB 缓冲区读取，避免每块新建 bytes 对象
+        h = hashlib.sha256()
+        buf = bytearray(1 << 20)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+        return h.hexdigest()
+
+
+def write_text(path: str, text: str) -> None:
+    """一次性编码为 UTF-8 后以二进制写出（不做换行符转换，报告内容跨平台一致）"""
+    with open(path, "wb") as f:
+        f.write(text.encode("utf-8"))
+
+
+def write_json(path: str, obj) -> None:
+    """写出带缩进的 UTF-8 JSON；安装了 orjson 时直接写字节，否则回退到标准库 json"""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+
+
+def fast_fingerprint(path: str, n: int = FINGERPRINT_BYTES) -> str:
+    """非加密快速指纹（只读文件开头 n 字节），仅用于判断是否同一文件，不能代替 SHA-256"""
+    with open(path, "rb") as f:
+        head = f.read(n)
+    return hashlib.blake2b(head, digest_size=8).hexdigest()
+
+
+def file_signature(path: str) -> str:
+    """文件身份标识：绝对路径 | 大小 | 修改时间 | 开头内容指纹"""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{fast_fingerprint(path)}"
+
+
+def copy_and_hash(src: str, dst: str) -> str:
+    """
+    复制文件的同时计算 SHA-256，只读取一遍源文件；返回十六进制摘要。
+    不使用硬链接——证据副本必须与原图相互独立，否则之后改动原图会同时改动包内副本。
+    """
     h = hashlib.sha256()
-    with open(path, 'rb') as f:
-        for chunk in iter(lambda: f.read(8192), b''):
+    with open(src, 'rb') as fi, open(dst, 'wb') as fo:
+        while True:
+            chunk = fi.read(1 << 20)
+            if not chunk:
+                break
             h.update(chunk)
+            fo.write(chunk)
+    _copy_times(src, dst)
     return h.hexdigest()
 
 
+def _copy_times(src: str, dst: str) -> None:
+    """只保留访问/修改时间，不复制权限与标志位（报告另行记录 EXIF）"""
+    st = os.stat(src)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def _has_exif_magic(path: str) -> bool:
+    """按文件头判断是否为 JPEG / TIFF / HEIF 容器"""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    return head[:2] == b"\xff\xd8" or head[:4] in (b"II*\x00", b"MM\x00*") or head[4:8] == b"ftyp"
+
+
+_exif_cache = OrderedDict()
+
+
 def read_exif(path: str) -> dict:
-    if Image is None:
+    """读取 EXIF（带缓存）：同一文件未变化时直接返回上次解析结果，出错结果不缓存"""
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        return {"error": f"读取EXIF失败: {e}"}
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    cached = _exif_cache.get(key)
+    if cached is not None:
+        _exif_cache.move_to_end(key)
+        return dict(cached)
+    result = _read_exif_uncached(path)
+    if "error" not in result:
+        _exif_cache[key] = dict(result)
+        if len(_exif_cache) > EXIF_CACHE_SIZE:
+            _exif_cache.popitem(last=False)
+    return result
+
+
+def _read_exif_uncached(path: str) -> dict:
+    if os.path.splitext(path)[1].lower() not in EXIF_EXTS:
+        return {"info": "该格式无EXIF元数据"}
+    try:
+        if not _has_exif_magic(path):
+            return {"info": "该格式无EXIF元数据"}
+    except OSError as e:
+        return {"error": f"读取EXIF失败: {e}"}
+    if not _pil():
         return {"error": "Pillow 未安装，无法读取EXIF"}
     try:
-        img = Image.open(path)
-        exif_data = img._getexif() if hasattr(img, "_getexif") else None
+        with Image.open(path) as img:
+            try:
+                exif_obj = img.getexif()
+                exif_data = dict(exif_obj) if exif_obj else None
+                if exif_data:
+                    # getexif() 只含 IFD0；拍摄时间等位于 Exif 子 IFD，定位信息位于 GPS 子 IFD
+                    exif_data.update(exif_obj.get_ifd(ExifTags.IFD.Exif))
+                    gps = exif_obj.get_ifd(ExifTags.IFD.GPSInfo)
+                    if gps:
+                        exif_data[ExifTags.Base.GPSInfo] = gps
+            except (MemoryError, OSError, SyntaxError) as e:
+                return {"error": f"EXIF 数据损坏，已放弃解析: {e}"}
         result = {}
         if exif_data:
-            for k, v in exif_data.items():
-                tag = ExifTags.TAGS.get(k, str(k)) if ExifTags else str(k)
-                result[tag] = str(v)
+            items = list(exif_data.items())
+            if len(items) > EXIF_MAX_TAGS:
+                items = items[:EXIF_MAX_TAGS]
+                result["warning"] = f"EXIF 字段数量异常（{len(exif_data)}），仅保留前 {EXIF_MAX_TAGS} 项"
+            for k, v in items:
+                tag = ExifTags.TAGS.get(k)
+                if tag not in EXIF_WHITELIST:
+                    continue
+                text = str(v)
+                result[tag] = text if len(text) <= EXIF_VALUE_MAX_LEN else text[:EXIF_VALUE_MAX_LEN] + "…"
         return result
     except Exception as e:
         return {"error": f"读取EXIF失败: {e}"}
 
 
+def _probe_time_source(session, url: str, kind: str):
+    """
+    请求单个时间源。
+    成功返回 {"source", "utc_datetime", "unixtime"}；无有效时间返回 None；网络等错误直接抛出。
+    """
+    if kind == "json_wta":
+        r = session.get(url, timeout=8)
+        r.raise_for_status()
+        data = r.json()
+        utc_dt = data.get("utc_datetime")
+        unixtime = data.get("unixtime")
+        if utc_dt:
+            return {"source": url, "utc_datetime": utc_dt, "unixtime": unixtime}
+
+    elif kind == "json_timeapi":
+        r = session.get(url, timeout=8)
+        r.raise_for_status()
+        data = r.json()
+        # timeapi.io 返回的字段可能为 dateTime（ISO8601）
+        iso = data.get("dateTime") or data.get("time")
+        if iso:
+            try:
+                # 兼容末尾 Z 的情况
+                d = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+                ts = int(d.timestamp())
+            except Exception:
+                ts = None
+            return {"source": url, "utc_datetime": iso, "unixtime": ts}
+
+    elif kind == "http_date":
+        # 优先 HEAD，若失败或无 Date 则回退 GET（部分站点对 HEAD 支持不佳）
+        r = session.head(url, timeout=6, allow_redirects=True)
+        r.close()
+        if r.status_code >= 400 or ("Date" not in r.headers and "date" not in r.headers):
+            # 只需要响应头，不读取响应体，及时归还连接池中的连接
+            r = session.get(url, timeout=8, stream=True)
+            r.close()
+        date_hdr = r.headers.get("Date") or r.headers.get("date")
+        if date_hdr:
+            try:
+                from email.utils import parsedate_to_datetime
+                from datetime import timezone
+                d = parsedate_to_datetime(date_hdr)
+                if d.tzinfo is None:
+                    d = d.replace(tzinfo=timezone.utc)
+                iso = d.astimezone(timezone.utc).isoformat()
+                ts = int(d.timestamp())
+                return {"source": f"{url} (HTTP Date)", "utc_datetime": iso, "unixtime": ts}
+            except Exception:
+                # 无法解析则直接返回原始 Date 文本
+                return {"source": f"{url} (HTTP Date)", "utc_datetime": date_hdr}
+    return None
+
+
+@ttl_cache(30)
 def fetch_world_time() -> dict:
     """
     获取 UTC 时间，具备多源回退与重试：
     1) worldtimeapi.org JSON
     2) timeapi.io JSON
     3) 多站点 HTTP Date 响应头（Google / Microsoft / Baidu）
+    所有来源并发请求，采用最先返回的有效结果，其余请求结果直接忽略。
     返回字段：{"source", "utc_datetime", "unixtime"}
     """
-    if requests is None:
+    session = _session()
+    if session is None:
         return {"error": "requests 未安装，无法获取网络时间"}
 
-    # 构建带重试的会话
-    try:
-        from requests.adapters import HTTPAdapter
-        from urllib3.util import Retry
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
-        session.mount("https://", HTTPAdapter(max_retries=retries))
-        session.mount("http://", HTTPAdapter(max_retries=retries))
-    except Exception:
-        session = requests  # 回退为直接使用 requests
-
     sources = [
         ("https://worldtimeapi.org/api/timezone/Etc/UTC", "json_wta", "json_wta"),
         ("https://timeapi.io/api/Time/current/zone?timeZone=UTC", "json_timeapi", "json_timeapi"),
@@ -88,93 +419,157 @@ def fetch_world_time() -> dict:
     ]
 
     errors = []
+    results = queue.Queue()
 
-    for url, tag, kind in sources:
+    def probe(url, tag, kind):
         try:
-            if kind == "json_wta":
-                r = session.get(url, timeout=8)
-                r.raise_for_status()
-                data = r.json()
-                utc_dt = data.get("utc_datetime")
-                unixtime = data.get("unixtime")
-                if utc_dt:
-                    return {"source": url, "utc_datetime": utc_dt, "unixtime": unixtime}
-
-            elif kind == "json_timeapi":
-                r = session.get(url, timeout=8)
-                r.raise_for_status()
-                data = r.json()
-                # timeapi.io 返回的字段可能为 dateTime（ISO8601）
-                iso = data.get("dateTime") or data.get("time")
-                if iso:
-                    try:
-                        from datetime import datetime, timezone
-                        # 兼容末尾 Z 的情况
-                        d = datetime.fromisoformat(iso.replace("Z", "+00:00"))
-                        ts = int(d.timestamp())
-                    except Exception:
-                        ts = None
-                    return {"source": url, "utc_datetime": iso, "unixtime": ts}
-
-            elif kind == "http_date":
-                # 优先 HEAD，若失败或无 Date 则回退 GET（部分站点对 HEAD 支持不佳）
-                r = session.head(url, timeout=6, allow_redirects=True)
-                if r.status_code >= 400 or ("Date" not in r.headers and "date" not in r.headers):
-                    r = session.get(url, timeout=8, stream=True)
-                date_hdr = r.headers.get("Date") or r.headers.get("date")
-                if date_hdr:
-                    try:
-                        from email.utils import parsedate_to_datetime
-                        from datetime import timezone
-                        d = parsedate_to_datetime(date_hdr)
-                        if d.tzinfo is None:
-                            d = d.replace(tzinfo=timezone.utc)
-                        iso = d.astimezone(timezone.utc).isoformat()
-                        ts = int(d.timestamp())
-                        return {"source": f"{url} (HTTP Date)", "utc_datetime": iso, "unixtime": ts}
-                    except Exception:
-                        # 无法解析则直接返回原始 Date 文本
-                        return {"source": f"{url} (HTTP Date)", "utc_datetime": date_hdr}
+            results.put((tag, _probe_time_source(session, url, kind), None))
         except Exception as e:
-            errors.append(f"{tag}: {e}")
+            results.put((tag, None, e))
+
+    # 使用守护线程而非线程池：拿到首个结果即返回，较慢的请求也不会拖住进程退出
+    for url, tag, kind in sources:
+        threading.Thread(target=probe, args=(url, tag, kind), daemon=True).start()
+
+    deadline = time.monotonic() + 8
+    for _ in sources:
+        try:
+            tag, result, err = results.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            errors.append("部分时间源请求超时")
+            break
+        if err is not None:
+            errors.append(f"{tag}: {err}")
+            continue
+        if result and result.get("utc_datetime"):
+            return result
 
     return {"error": "获取网络时间失败", "details": errors}
 
 
+def _stooq_url(symbols: list) -> str:
+    # stooq 的 s= 参数支持以空格（URL 中为 +）分隔的多个代码
+    return "https://stooq.com/q/l/?s=" + "+".join(quote(s) for s in symbols) + "&f=sd2t2ohlcv&h&e=csv"
+
+
+def _stooq_rows(text: str) -> list:
+    """解析 stooq CSV 响应，返回字段名小写、值去除空白的行字典列表"""
+    reader = csv.DictReader(io.StringIO(text))
+    return [
+        {k.strip().lower(): (v or "").strip() for k, v in row.items() if k is not None}
+        for row in reader
+    ]
+
+
+@ttl_cache(STOCK_CACHE_TTL)
 def fetch_stock_quote(symbol: str) -> dict:
     """
     使用 stooq 免费接口，无需API Key。
     例如: AAPL.US, TSLA.US, 000001.SS
     文档: https://stooq.com/db/
     """
-    if requests is None:
+    session = _session()
+    if session is None:
         return {"error": "requests 未安装，无法获取股价"}
     sym = symbol.strip().lower()
     if not sym:
         return {"error": "股票代码不能为空"}
     # CSV 简易接口
-    url = f"https://stooq.com/q/l/?s={quote(sym)}&f=sd2t2ohlcv&h&e=csv"
+    url = _stooq_url([sym])
     try:
-        r = requests.get(url, timeout=8)
+        r = session.get(url, timeout=8)
         r.raise_for_status()
-        lines = r.text.strip().splitlines()
-        if len(lines) < 2:
+        rows = _stooq_rows(r.text)
+        if not rows:
             return {"error": "返回数据异常", "source": url}
-        header = [h.strip().lower() for h in lines[0].split(',')]
-        values = [v.strip() for v in lines[1].split(',')]
-        data = dict(zip(header, values))
+        data = rows[0]
         data["source"] = url
         return data
     except Exception as e:
         return {"error": f"获取股价失败: {e}", "source": url}
 
 
+def fetch_stock_quotes(symbols: list) -> list:
+    """
+    一次请求获取多个股票行情，返回与 symbols 顺序一致的结果列表。
+    与 fetch_stock_quote 共用缓存（键为小写代码），缓存未过期的代码不再请求；
+    合并请求失败或缺少某些代码时，缺失的代码回退为逐个请求。
+    """
+    session = _session()
+    if session is None:
+        return [{"error": "requests 未安装，无法获取股价"} for _ in symbols]
+    syms = [s.strip().lower() for s in symbols]
+
+    quotes = {}
+    for s in syms:
+        if s and s not in quotes:
+            data = _net_cache_get(("fetch_stock_quote", (s,)), STOCK_CACHE_TTL)
+            if data is not None:
+                quotes[s] = data
+    wanted = [s for s in dict.fromkeys(syms) if s and s not in quotes]
+
+    if wanted:
+        try:
+            r = session.get(_stooq_url(wanted), timeout=8)
+            r.raise_for_status()
+            for row in _stooq_rows(r.text):
+                s = row.get("symbol", "").lower()
+                if s in wanted:
+                    row["source"] = _stooq_url([s])
+                    _net_cache_put(("fetch_stock_quote", (s,)), row)
+                    quotes[s] = row
+        except Exception:
+            pass
+
+    missing = list(dict.fromkeys(s for s in syms if s not in quotes))
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(len(missing), 10)) as ex:
+            quotes.update(zip(missing, ex.map(fetch_stock_quote, missing)))
+
+    return [dict(quotes[s]) for s in syms]
+
+
+def verify_publish_url(url: str) -> dict:
+    """抓取发布平台 URL 的状态码、重定向后地址与 HTTP Date，供第三方核验；响应用完即关闭以归还连接"""
+    info = {"url": url}
+    session = _session()
+    if session is None:
+        info["error"] = "requests 未安装，无法验证发布平台"
+        return info
+    try:
+        r = None
+        # 先尝试 HEAD
+        try:
+            r = session.head(url, timeout=8, allow_redirects=True)
+            # 某些站点对 HEAD 支持不佳，若无 Date 继续 GET
+            if r.status_code >= 400 or ("Date" not in r.headers and "date" not in r.headers):
+                raise Exception("HEAD 无 Date 或状态异常")
+        except Exception:
+            if r is not None:
+                r.close()
+            r = session.get(url, timeout=10, stream=True, allow_redirects=True)
+        try:
+            info.update({
+                "status_code": r.status_code,
+                "final_url": r.url or url,
+                "http_date": r.headers.get("Date") or r.headers.get("date"),
+                "content_type": r.headers.get("Content-Type"),
+                "content_length": r.headers.get("Content-Length"),
+            })
+        finally:
+            r.close()
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+
 class EvidenceApp:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: "tk.Tk"):
         self.root = root
         self.root.title(APP_TITLE)
         self.root.geometry("980x700")
         self.photo_path = None
+        self._hash_signature = None  # 计算 state["hash"] 时照片的文件签名，用于发现照片已变化
         self.state = {
             "hash": None,
             "exif": None,
@@ -230,6 +625,7 @@ class EvidenceApp:
         self.preview_label = ttk.Label(preview, text="未选择图片", anchor=tk.CENTER)
         self.preview_label.pack(fill=tk.BOTH, expand=True)
         self._preview_image = None  # 保存缩略图引用防止被GC
+        self._thumb_cache = OrderedDict()  # (路径, 修改时间, 尺寸) -> PhotoImage，LRU 淘汰
 
         # 股票/时间区块（可滚动）
         stock_frame = ttk.LabelFrame(self.content, text="股票行情数据")
@@ -343,9 +739,31 @@ class EvidenceApp:
         except Exception:
             pass
 
+    def _run_bg(self, work, on_done):
+        """在后台线程执行 work()，完成后回到 Tk 线程调用 on_done(结果)，避免网络/磁盘操作卡住界面"""
+        def runner():
+            try:
+                res = work()
+            except Exception as e:
+                self.root.after(0, self._on_bg_error, e)
+            else:
+                self.root.after(0, on_done, res)
+        threading.Thread(target=runner, daemon=True).start()
+
+    def _on_bg_error(self, e: Exception):
+        self.log_append(f"后台任务失败: {e}")
+        self._set_status("就绪")
+        self._busy(False)
+
     def log_append(self, text: str):
+        # 可在任意线程调用：不在 Tk 主线程时经 root.after 转回主线程执行
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, self.log_append, text)
+            return
         self.log.config(state=tk.NORMAL)
-        self.log.insert(tk.END, f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {text}\n")
+        self.log.insert(tk.END, f"{_log_timestamp()} - {text}\n")
+        if int(self.log.index("end-1c").split(".")[0]) > LOG_TRIM_AT:
+            self.log.delete("1.0", f"end-{LOG_KEEP_LINES}l")
         self.log.see(tk.END)
         self.log.config(state=tk.DISABLED)
 
@@ -361,11 +779,20 @@ class EvidenceApp:
         self.log_append(f"选择照片: {path}")
         # 加载缩略图预览
         try:
-            if Image is not None:
-                img = Image.open(path)
-                img.thumbnail((640, 360))
-                from PIL import ImageTk
-                self._preview_image = ImageTk.PhotoImage(img)
+            if _pil():
+                key = (path, os.path.getmtime(path), PREVIEW_SIZE)
+                thumb = self._thumb_cache.get(key)
+                if thumb is None:
+                    with Image.open(path) as img:
+                        img.thumbnail(PREVIEW_SIZE)
+                        from PIL import ImageTk
+                        thumb = ImageTk.PhotoImage(img)
+                    self._thumb_cache[key] = thumb
+                    if len(self._thumb_cache) > THUMB_CACHE_SIZE:
+                        self._thumb_cache.popitem(last=False)
+                else:
+                    self._thumb_cache.move_to_end(key)
+                self._preview_image = thumb
                 self.preview_label.configure(image=self._preview_image, text="")
             else:
                 self.preview_label.configure(text="未安装Pillow，无法预览")
@@ -376,9 +803,15 @@ class EvidenceApp:
         if not self.photo_path:
             messagebox.showwarning("提示", "请先选择照片")
             return
+        h = self._hash_photo()
+        self.log_append(f"SHA-256: {h}")
+
+    def _hash_photo(self) -> str:
+        signature = file_signature(self.photo_path)
         h = sha256_file(self.photo_path)
         self.state["hash"] = h
-        self.log_append(f"SHA-256: {h}")
+        self._hash_signature = signature
+        return h
 
     def do_exif(self):
         if not self.photo_path:
@@ -388,23 +821,30 @@ class EvidenceApp:
         self.state["exif"] = exif
         if "error" in exif:
             self.log_append(exif["error"])
+        elif "info" in exif:
+            self.log_append(exif["info"])
         else:
+            if "warning" in exif:
+                self.log_append(exif["warning"])
             dt = exif.get("DateTimeOriginal") or exif.get("DateTime") or exif.get("CreateDate")
             self.log_append(f"读取EXIF成功，拍摄时间: {dt if dt else '未知'}")
 
     def do_time(self):
         self._busy(True)
         self._set_status("正在获取网络UTC时间…")
-        try:
-            data = fetch_world_time()
-            self.state["world_time"] = data
-            if "error" in data:
-                self.log_append(data["error"])
-            else:
-                self.log_append(f"网络UTC时间: {data.get('utc_datetime')} (来源: {data.get('source')})")
-        finally:
-            self._set_status("就绪")
-            self._busy(False)
+        self._run_bg(fetch_world_time, self._on_time_done)
+
+    def _on_time_done(self, data: dict):
+        self.state["world_time"] = data
+        self._log_world_time(data)
+        self._set_status("就绪")
+        self._busy(False)
+
+    def _log_world_time(self, data: dict):
+        if "error" in data:
+            self.log_append(data["error"])
+        else:
+            self.log_append(f"网络UTC时间: {data.get('utc_datetime')} (来源: {data.get('source')})")
 
     def update_stock_inputs(self):
         """更新股票输入框数量"""
@@ -437,52 +877,46 @@ class EvidenceApp:
             self.stock_entries.append(entry)
     
     def do_stocks(self):
-        """获取多个股票的行情数据"""
+        """获取多个股票的行情数据（后台线程合并请求，不阻塞界面）"""
         if not self.stock_entries:
             messagebox.showwarning("提示", "请先设置股票数量")
             return
-        
+
+        symbols = [entry.get().strip() for entry in self.stock_entries]
+        symbols = [s for s in symbols if s]
+
         self._busy(True)
         self._set_status("正在获取股票行情数据…")
-        
+        self._run_bg(lambda: fetch_stock_quotes(symbols), lambda quotes: self._on_stocks_done(symbols, quotes))
+
+    def _on_stocks_done(self, symbols: list, quotes: list):
         stocks_data = []
         errors = []
-        
-        for i, entry in enumerate(self.stock_entries):
-            symbol = entry.get().strip()
-            if not symbol:
-                continue
-                
-            try:
-                self._set_status(f"正在获取股价: {symbol}…")
-                data = fetch_stock_quote(symbol)
-                
-                # 添加股票代码信息
-                data["symbol"] = symbol.upper()
-                
-                if "error" in data:
-                    errors.append(f"{symbol}: {data['error']}")
-                else:
-                    stocks_data.append(data)
-                    self.log_append(f"股价: {symbol} {data.get('close')} 日期: {data.get('date')} 时间: {data.get('time')}")
-                    
-            except Exception as e:
-                errors.append(f"{symbol}: 获取失败 - {e}")
-        
+
+        for symbol, data in zip(symbols, quotes):
+            # 添加股票代码信息
+            data["symbol"] = symbol.upper()
+
+            if "error" in data:
+                errors.append(f"{symbol}: {data['error']}")
+            else:
+                stocks_data.append(data)
+                self.log_append(f"股价: {symbol} {data.get('close')} 日期: {data.get('date')} 时间: {data.get('time')}")
+
         # 更新状态
         self.state["stocks"] = stocks_data
-        
+
         if errors:
             self.log_append(f"部分股票获取失败: {'; '.join(errors)}")
-        
+
         if stocks_data:
             self.log_append(f"成功获取 {len(stocks_data)} 个股票的行情数据")
         else:
             self.log_append("未能获取任何股票数据")
-            
+
         self._set_status("就绪")
         self._busy(False)
-    
+
     def clear_stocks(self):
         """清空股票数据"""
         self.state["stocks"] = []
@@ -514,70 +948,56 @@ class EvidenceApp:
             with open(path, "r", encoding="utf-8") as f:
                 content = f.read()
             # 简易Markdown解析（标题、加粗、斜体、行内代码、代码块、链接）
-            self.md_text.config(state=tk.NORMAL)
-            self.md_text.delete("1.0", tk.END)
-            import re
+            # 先在 Python 中拼出全文与标签区间，再一次性插入，减少与 Tk 的往返调用
             lines = content.splitlines()
+            out_lines = []
+            tag_ranges = []  # (标签, 行号, 起始列, 结束列)
             in_code_block = False
-            for i, line in enumerate(lines):
+            for line in lines:
+                ln = len(out_lines) + 1
                 # 代码块 ```
                 if line.strip().startswith("```"):
                     in_code_block = not in_code_block
-                    if in_code_block:
-                        self.md_text.insert(tk.END, "\n")
-                    else:
-                        self.md_text.insert(tk.END, "\n")
+                    out_lines.append("")
                     continue
                 if in_code_block:
-                    start = self.md_text.index(tk.END)
-                    self.md_text.insert(tk.END, line + "\n")
-                    end = self.md_text.index(tk.END)
-                    self.md_text.tag_add("code", start, end)
+                    out_lines.append(line)
+                    tag_ranges.append(("code", ln, 0, len(line)))
                     continue
                 # 标题
                 if line.startswith("### "):
-                    start = self.md_text.index(tk.END)
-                    self.md_text.insert(tk.END, line[4:] + "\n")
-                    end = self.md_text.index(tk.END)
-                    self.md_text.tag_add("h3", start, end)
+                    out_lines.append(line[4:])
+                    tag_ranges.append(("h3", ln, 0, len(line) - 4))
                     continue
                 if line.startswith("## "):
-                    start = self.md_text.index(tk.END)
-                    self.md_text.insert(tk.END, line[3:] + "\n")
-                    end = self.md_text.index(tk.END)
-                    self.md_text.tag_add("h2", start, end)
+                    out_lines.append(line[3:])
+                    tag_ranges.append(("h2", ln, 0, len(line) - 3))
                     continue
                 if line.startswith("# "):
-                    start = self.md_text.index(tk.END)
-                    self.md_text.insert(tk.END, line[2:] + "\n")
-                    end = self.md_text.index(tk.END)
-                    self.md_text.tag_add("h1", start, end)
+                    out_lines.append(line[2:])
+                    tag_ranges.append(("h1", ln, 0, len(line) - 2))
                     continue
                 # 普通段落，处理加粗、斜体、行内代码、链接
-                text = line + "\n"
-                start_para = self.md_text.index(tk.END)
-                self.md_text.insert(tk.END, text)
-                end_para = self.md_text.index(tk.END)
+                out_lines.append(line)
                 # 加粗 **text**
-                for m in re.finditer(r"\*\*(.+?)\*\*", text):
-                    s = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.start()}"
-                    e = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.end()}"
-                    self.md_text.tag_add("bold", s, e)
+                for m in _RE_BOLD.finditer(line):
+                    tag_ranges.append(("bold", ln, m.start(), m.end()))
                 # 斜体 *text* 或 _text_
-                for m in re.finditer(r"(?<!\*)\*(.+?)\*(?!\*)|_(.+?)_", text):
-                    s = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.start()}"
-                    e = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.end()}"
-                    self.md_text.tag_add("italic", s, e)
+                for m in _RE_ITALIC.finditer(line):
+                    tag_ranges.append(("italic", ln, m.start(), m.end()))
                 # 行内代码 `code`
-                for m in re.finditer(r"`([^`]+)`", text):
-                    s = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.start()}"
-                    e = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.end()}"
-                    self.md_text.tag_add("code", s, e)
+                for m in _RE_CODE.finditer(line):
+                    tag_ranges.append(("code", ln, m.start(), m.end()))
                 # 链接 [text](url)
-                for m in re.finditer(r"\[([^\]]+)\]\(([^\)]+)\)", text):
-                    s = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.start(1)}"
-                    e = f"{start_para.split('.')[0]}.{int(start_para.split('.')[1]) + m.end(1)}"
-                    self.md_text.tag_add("link", s, e)
+                for m in _RE_LINK.finditer(line):
+                    tag_ranges.append(("link", ln, m.start(1), m.end(1)))
+
+            self.md_text.config(state=tk.NORMAL)
+            self.md_text.delete("1.0", tk.END)
+            self.md_text.insert("1.0", "\n".join(out_lines))
+            for tag, ln, c0, c1 in tag_ranges:
+                line = out_lines[ln - 1]
+                self.md_text.tag_add(tag, f"{ln}.{_tk_col(line, c0)}", f"{ln}.{_tk_col(line, c1)}")
             self.md_text.config(state=tk.DISABLED)
         except Exception as e:
             self.md_text.config(state=tk.NORMAL)
@@ -587,6 +1007,7 @@ class EvidenceApp:
 
     def open_output_dir(self):
         os.makedirs(OUTPUT_DIR, exist_ok=True)
+        import webbrowser
         webbrowser.open(OUTPUT_DIR)
 
     def _collect_publish_urls(self):
@@ -595,49 +1016,90 @@ class EvidenceApp:
         self.state["publish_urls"] = urls
         return urls
 
-    def _make_package_dir(self) -> str:
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def _make_package_dir(self, ts: datetime = None) -> str:
+        ts = (ts or datetime.now()).strftime("%Y%m%d_%H%M%S")
         base = os.path.join(OUTPUT_DIR, f"evidence_{ts}")
         os.makedirs(base, exist_ok=True)
         return base
 
-    def _copy_photo(self, pkg_dir: str):
-        if not self.photo_path:
-            return None
-        name = safe_filename(os.path.basename(self.photo_path))
+    def _copy_photo(self, photo_path: str, pkg_dir: str):
+        """复制图片到证据包目录，返回 (复制路径, 复制时计算的 SHA-256)；失败返回 (None, None)"""
+        if not photo_path:
+            return None, None
+        name = safe_filename(os.path.basename(photo_path))
         dst = os.path.join(pkg_dir, name)
         try:
-            shutil.copy2(self.photo_path, dst)
-            return dst
+            digest = copy_and_hash(photo_path, dst)
+            return dst, digest
         except Exception as e:
             self.log_append(f"复制图片失败: {e}")
-            return None
+            return None, None
 
     def generate_report(self):
         if not self.photo_path:
             messagebox.showwarning("提示", "请先选择照片并计算哈希/读取EXIF")
             return
-        if not self.state.get("hash"):
-            self.do_hash()
-        if not self.state.get("world_time"):
-            self.do_time()
         self._collect_publish_urls()
-        self.state["created_at"] = datetime.now().isoformat()
+        # 在 Tk 线程中取一份快照交给后台线程；生成期间用户换照片、重新计算或清空股票都不会混入本次报告
+        job = {
+            "photo_path": self.photo_path,
+            "hash": self.state.get("hash"),
+            "hash_signature": self._hash_signature,
+            "exif": self.state.get("exif"),
+            "world_time": self.state.get("world_time"),
+            "stocks": list(self.state.get("stocks") or []),
+            "publish_urls": list(self.state.get("publish_urls") or []),
+        }
+        self._busy(True)
+        self._set_status("正在生成证据包…")
+        self._run_bg(lambda: self._build_package_in_bg(job), self._on_report_done)
+
+    def _on_report_done(self, result: dict):
+        # 后台补算的哈希与网络时间在 Tk 线程中写回；期间已换照片或重新计算过哈希时以界面上的为准
+        job = result["job"]
+        if job["photo_path"] == self.photo_path:
+            if job["hash_signature"] == self._hash_signature:
+                self.state["hash"] = result["hash"]
+                self._hash_signature = result["hash_signature"]
+            if not self.state.get("world_time"):
+                self.state["world_time"] = result["world_time"]
+        self.state["created_at"] = result["created_at"]
+        self.log_append(f"已生成证据包: {result['pkg']}")
+        self._set_status("就绪")
+        self._busy(False)
+        import webbrowser
+        webbrowser.open(result["report_path"])
+
+    def _build_package_in_bg(self, job: dict) -> dict:
+        """后台线程：按 generate_report 取的快照补齐哈希与网络时间，复制图片、验证并写出报告；不读写 self.state"""
+        photo_path = job["photo_path"]
+        # 未计算过哈希，或照片在计算后已被修改时重新计算
+        h, signature = job["hash"], file_signature(photo_path)
+        if not h or job["hash_signature"] != signature:
+            h = sha256_file(photo_path)
+            self.log_append(f"SHA-256: {h}")
+        world = job["world_time"]
+        if not world:
+            world = fetch_world_time()
+            self._log_world_time(world)
+        # 同一份报告只取一次当前时间，生成时间与目录名保持一致
+        now = datetime.now()
 
-        pkg = self._make_package_dir()
-        copied = self._copy_photo(pkg)
+        pkg = self._make_package_dir(now)
+        copied, copied_hash = self._copy_photo(photo_path, pkg)
 
         # 保存元数据
+        stocks = job["stocks"]
         meta = {
-            "photo_original_path": self.photo_path,
+            "photo_original_path": photo_path,
             "photo_copied_path": copied,
-            "sha256": self.state.get("hash"),
-            "exif": self.state.get("exif"),
-            "world_time": self.state.get("world_time"),
-            "stocks": self.state.get("stocks", []),  # 改为多个股票数据
-            "stock": self.state.get("stocks", [{}])[0] if self.state.get("stocks") else None,  # 保留兼容性
-            "publish_urls": self.state.get("publish_urls", []),
-            "created_at": self.state.get("created_at"),
+            "sha256": h,
+            "exif": job["exif"],
+            "world_time": world,
+            "stocks": stocks,  # 改为多个股票数据
+            "stock": stocks[0] if stocks else None,  # 保留兼容性
+            "publish_urls": job["publish_urls"],
+            "created_at": now.isoformat(),
             "app": APP_TITLE,
             "version": "1.0.0"
         }
@@ -647,10 +1109,10 @@ class EvidenceApp:
             "hash_check": None,
             "publish_checks": []
         }
-        # 本地哈希复算
+        # 本地哈希复算（复制时已流式计算，无需再次读取文件）
         try:
-            if copied and os.path.isfile(copied):
-                new_hash = sha256_file(copied)
+            if copied and copied_hash and os.path.isfile(copied):
+                new_hash = copied_hash
                 verification["hash_check"] = {
                     "recomputed_sha256": new_hash,
                     "expected_sha256": meta.get("sha256"),
@@ -666,165 +1128,196 @@ class EvidenceApp:
         # 发布平台验证：抓取HTTP Date/状态码/重定向后URL
         urls = meta.get("publish_urls") or []
         if urls:
-            if requests is None:
+            if _session() is None:
                 verification["publish_checks"].append({"error": "requests 未安装，无法验证发布平台"})
             else:
-                try:
-                    from requests.adapters import HTTPAdapter
-                    from urllib3.util import Retry
-                    sess = requests.Session()
-                    retries = Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
-                    sess.mount("https://", HTTPAdapter(max_retries=retries))
-                    sess.mount("http://", HTTPAdapter(max_retries=retries))
-                except Exception:
-                    sess = requests
-                for u in urls:
-                    info = {"url": u}
-                    try:
-                        r = None
-                        # 先尝试 HEAD
-                        try:
-                            r = sess.head(u, timeout=8, allow_redirects=True)
-                            # 某些站点对 HEAD 支持不佳，若无 Date 继续 GET
-                            if r.status_code >= 400 or ("Date" not in r.headers and "date" not in r.headers):
-                                raise Exception("HEAD 无 Date 或状态异常")
-                        except Exception:
-                            r = sess.get(u, timeout=10, stream=True, allow_redirects=True)
-                        info.update({
-                            "status_code": getattr(r, 'status_code', None),
-                            "final_url": getattr(r, 'url', u),
-                            "http_date": (r.headers.get("Date") or r.headers.get("date")) if r is not None else None,
-                            "content_type": r.headers.get("Content-Type") if r is not None else None,
-                            "content_length": r.headers.get("Content-Length") if r is not None else None,
-                        })
-                    except Exception as e:
-                        info["error"] = str(e)
-                    verification["publish_checks"].append(info)
+                # 每个 URL 一个任务并发验证，总耗时取决于最慢的一个而非总和
+                with ThreadPoolExecutor(max_workers=min(8, len(urls))) as ex:
+                    verification["publish_checks"] = list(ex.map(verify_publish_url, urls))
 
         # 将验证信息写入元数据
         meta["verification"] = verification
 
         # 写 evidence.json（包含验证结果）
         meta_path = os.path.join(pkg, "evidence.json")
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(meta, f, ensure_ascii=False, indent=2)
+        write_json(meta_path, meta)
 
         # 生成HTML报告
         report_path = os.path.join(pkg, "report.html")
-        html = self._build_html_report(meta)
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(html)
+        write_text(report_path, self._build_html_report(meta))
 
-        # 生成更详细的 Markdown 报告
+        # 生成更详细的 Markdown 报告（写入 StringIO 缓冲，最后一次性落盘）
         md_path = os.path.join(pkg, "report.md")
         try:
-            lines = []
-            lines.append(f"# {APP_TITLE} - 证明报告\n")
-            lines.append(f"- 生成时间：{meta.get('created_at')}")
-            lines.append(f"- 应用版本：{meta.get('version')}\n")
+            buf = io.StringIO()
+            w = buf.write
+            w(f"""# {APP_TITLE} - 证明报告
+
+- 生成时间：{meta.get('created_at')}
+- 应用版本：{meta.get('version')}
 
-            lines.append("## 一、照片基础信息")
-            lines.append(f"- 原始路径：`{meta.get('photo_original_path')}`")
-            lines.append(f"- 复制路径：`{meta.get('photo_copied_path')}`")
-            lines.append(f"- SHA-256 摘要：`{meta.get('sha256')}`\n")
+## 一、照片基础信息
+- 原始路径：`{meta.get('photo_original_path')}`
+- 复制路径：`{meta.get('photo_copied_path')}`
+- SHA-256 摘要：`{meta.get('sha256')}`
 
-            lines.append("## 二、EXIF 元数据")
+## 二、EXIF 元数据
+""")
             exif = meta.get('exif') or {}
             if isinstance(exif, dict) and exif:
-                lines.append("")
-                lines.append("| 字段 | 值 |")
-                lines.append("|---|---|")
-                for k, v in exif.items():
-                    lines.append(f"| {str(k)} | {str(v).replace('|','\\|')} |")
-                lines.append("")
+                w("\n| 字段 | 值 |\n|---|---|\n")
+                w("".join([_MD_EXIF_ROW.format(k, str(v).replace("|", "\\|")) for k, v in exif.items()]))
+                w("\n")
             else:
-                lines.append("- 无或读取失败\n")
+                w("- 无或读取失败\n\n")
 
-            lines.append("## 三、外部不可预测信息")
+            w("## 三、外部不可预测信息\n")
             world = meta.get('world_time') or {}
             if world:
-                lines.append(f"- 网络UTC时间：{world.get('utc_datetime')} (来源：{world.get('source')})")
-            
+                w(f"- 网络UTC时间：{world.get('utc_datetime')} (来源：{world.get('source')})\n")
+
             stocks = meta.get('stocks', [])
             if stocks:
-                lines.append(f"- 股票行情数据（共{len(stocks)}只）：")
-                lines.append("")
-                lines.append("| 股票代码 | 收盘价 | 日期 | 时间 | 成交量 | 数据源 |")
-                lines.append("|---|---|---|---|---|---|")
-                for stock_item in stocks:
-                    if isinstance(stock_item, dict):
-                        lines.append(f"| {stock_item.get('symbol','')} | {stock_item.get('close','')} | {stock_item.get('date','')} | {stock_item.get('time','')} | {stock_item.get('volume','')} | [数据源]({stock_item.get('source','')}) |")
-                lines.append("")
+                w(f"- 股票行情数据（共{len(stocks)}只）：\n\n")
+                w("| 股票代码 | 收盘价 | 日期 | 时间 | 成交量 | 数据源 |\n|---|---|---|---|---|---|\n")
+                w("".join([
+                    _MD_STOCK_ROW.format(
+                        stock_item.get('symbol', ''), stock_item.get('close', ''), stock_item.get('date', ''),
+                        stock_item.get('time', ''), stock_item.get('volume', ''), stock_item.get('source', ''),
+                    )
+                    for stock_item in stocks if isinstance(stock_item, dict)
+                ]))
+                w("\n")
             else:
                 # 兼容性：单个股票数据
                 stock = meta.get('stock') or {}
                 if stock:
-                    lines.append(f"- 股票：收盘 {stock.get('close')}，日期 {stock.get('date')}，时间 {stock.get('time')}，来源 {stock.get('source')}")
-            
-            lines.append("")
-            lines.append(
-                "> 注：通过引用公开且不可预知的第三方数据（如网络标准时间与股票行情）来佐证生成时间点。\n"
-            )
+                    w(f"- 股票：收盘 {stock.get('close')}，日期 {stock.get('date')}，时间 {stock.get('time')}，来源 {stock.get('source')}\n")
+
+            w("\n> 注：通过引用公开且不可预知的第三方数据（如网络标准时间与股票行情）来佐证生成时间点。\n\n")
 
-            lines.append("## 四、发布记录与第三方验证")
+            w("## 四、发布记录与第三方验证\n")
             urls = meta.get('publish_urls') or []
             if urls:
-                for u in urls:
-                    lines.append(f"- 发布URL：{u}")
+                w("".join(f"- 发布URL：{u}\n" for u in urls))
             else:
-                lines.append("- 暂无（请在平台发布后粘贴URL）")
-            lines.append("")
+                w("- 暂无（请在平台发布后粘贴URL）\n")
+            w("\n")
             v = meta.get('verification') or {}
             hc = v.get('hash_check') or {}
             if hc:
                 ok = hc.get('match')
-                lines.append("### 本地哈希比对结果")
+                w("### 本地哈希比对结果\n")
                 if isinstance(ok, bool):
-                    lines.append(f"- 复算SHA-256：`{hc.get('recomputed_sha256')}`")
-                    lines.append(f"- 期望SHA-256：`{hc.get('expected_sha256')}`")
-                    lines.append(f"- 是否一致：{'是' if ok else '否'}\n")
+                    w(f"- 复算SHA-256：`{hc.get('recomputed_sha256')}`\n")
+                    w(f"- 期望SHA-256：`{hc.get('expected_sha256')}`\n")
+                    w(f"- 是否一致：{'是' if ok else '否'}\n\n")
                 elif 'error' in hc:
-                    lines.append(f"- 错误：{hc.get('error')}\n")
+                    w(f"- 错误：{hc.get('error')}\n\n")
             pcs = v.get('publish_checks') or []
             if pcs:
-                lines.append("### 发布平台验证（HTTP 头部）")
-                lines.append("")
-                lines.append("| URL | 状态码 | 最终URL | HTTP Date | Content-Type | Content-Length | 备注 |")
-                lines.append("|---|---:|---|---|---|---:|---|")
-                for item in pcs:
-                    lines.append(
-                        f"| {item.get('url','')} | {item.get('status_code','')} | {item.get('final_url','')} | {item.get('http_date','')} | {item.get('content_type','')} | {item.get('content_length','')} | {item.get('error','')} |"
+                w("### 发布平台验证（HTTP 头部）\n\n")
+                w("| URL | 状态码 | 最终URL | HTTP Date | Content-Type | Content-Length | 备注 |\n|---|---:|---|---|---|---:|---|\n")
+                w("".join([
+                    _MD_CHECK_ROW.format(
+                        item.get('url', ''), item.get('status_code', ''), item.get('final_url', ''), item.get('http_date', ''),
+                        item.get('content_type', ''), item.get('content_length', ''), item.get('error', ''),
                     )
-                lines.append("")
+                    for item in pcs
+                ]))
+                w("\n")
 
-            lines.append("## 五、验证指引")
-            lines.append("1. 第三方可独立下载图片并复算 SHA-256，与报告一致即证明未被篡改。")
-            lines.append("2. 打开上述发布URL，核对平台公开时间与 HTTP Date，辅助限定生成时间窗口。")
-            lines.append("3. 对网络时间与股票行情来源，可访问其官方接口或站点进行交叉验证。\n")
+            w("""## 五、验证指引
+1. 第三方可独立下载图片并复算 SHA-256，与报告一致即证明未被篡改。
+2. 打开上述发布URL，核对平台公开时间与 HTTP Date，辅助限定生成时间窗口。
+3. 对网络时间与股票行情来源，可访问其官方接口或站点进行交叉验证。
+""")
 
-            with open(md_path, 'w', encoding='utf-8') as f:
-                f.write("\n".join(lines))
+            write_text(md_path, buf.getvalue())
         except Exception as e:
             self.log_append(f"生成 Markdown 报告失败: {e}")
 
-        self.log_append(f"已生成证据包: {pkg}")
-        webbrowser.open(report_path)
+        return {
+            "pkg": pkg, "report_path": report_path, "job": job,
+            "hash": h, "hash_signature": signature, "world_time": world, "created_at": meta["created_at"],
+        }
 
     def _build_html_report(self, meta: dict) -> str:
-        def esc(s: str) -> str:
-            return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        return render_report(meta)
+
+
+_CSS = """body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, 'Noto Sans', 'PingFang SC', 'Microsoft YaHei', sans-serif; margin: 24px; }
+code, pre { background: #f7f7f7; padding: 2px 4px; }
+.table { border-collapse: collapse; width: 100%; }
+.table th, .table td { border: 1px solid #ddd; padding: 8px; }
+.section { margin: 18px 0; }
+small { color: #666; }"""
+
+# 报告中的静态片段只在导入时拼好一次，每次渲染只格式化动态部分
+_HTML_HEAD = f"""
+<!DOCTYPE html>
+<html lang=zh>
+<head>
+<meta charset="utf-8" />
+<title>{_html_escape(APP_TITLE, quote=False)} - 证明报告</title>
+<style>
+{_CSS}
+</style>
+</head>
+<body>
+"""
+
+_HTML_PUBLISH_NOTE = """  </ul>
+  <p><small>提示：将同一图片在多平台公开发布可增强举证链。此处记录发布URL以供核验。</small></p>
+</div>
+<div class="section">
+  <h2>五、完整性与可验证性</h2>
+  <ol>
+    <li>使用 SHA-256 对图片文件取哈希，确保内容未被篡改；第三方可复算核验。</li>
+    <li>记录 EXIF 拍摄时间等元数据（若存在），结合外部公开数据佐证。</li>
+    <li>通过公开时间源与市场行情等不可预测信息，限定生成时间窗口。</li>
+    <li>可访问以上发布URL验证公开发布的时间戳。</li>
+  </ol>
+</div>"""
 
-        photo_rel = os.path.basename(meta.get("photo_copied_path") or "")
-        exif = meta.get("exif") or {}
-        world = meta.get("world_time") or {}
+_HTML_TAIL = """</body>
+</html>
+"""
+
+
+def render_report(meta: dict, cli: bool = False) -> str:
+    """
+    渲染 HTML 证明报告，GUI 与命令行降级共用。
+    cli=True 时为命令行模式：标题注明模式，只包含照片、EXIF 与外部时间源。
+    """
+    # 固定字段预先统一转义一次
+    m = {k: esc(str(meta.get(k) or "")) for k in ("created_at", "photo_original_path", "photo_copied_path", "sha256", "app", "version")}
+    photo_rel = os.path.basename(meta.get("photo_copied_path") or "")
+    exif = meta.get("exif") or {}
+    world = meta.get("world_time") or {}
+
+    exif_rows = "".join([
+        _EXIF_ROW.format(esc(str(k)), esc(str(v))) for k, v in (exif.items() if isinstance(exif, dict) else [])
+    ]) if exif else "<tr><td colspan=2>无或读取失败</td></tr>"
+
+    world_block = "" if not world else (
+        f"<p><strong>网络UTC时间</strong>：{esc(world.get('utc_datetime',''))}（来源：<a href='{esc(world.get('source',''))}' target='_blank'>worldtimeapi</a>）</p>"
+    )
+
+    if cli:
+        mode = "（命令行模式）"
+        h_photo, h_exif = "照片基础信息", "EXIF 元数据"
+        tail_sections = f"""<div class="section">
+  <h2>外部时间源</h2>
+  {world_block}
+</div>"""
+    else:
+        mode = ""
+        h_photo, h_exif = "一、照片基础信息", "二、EXIF 元数据"
         stocks = meta.get("stocks", [])  # 获取多个股票数据
         stock = meta.get("stock") or {}  # 兼容性
         publish_urls = meta.get("publish_urls") or []
 
-        exif_rows = "".join(
-            f"<tr><td>{esc(str(k))}</td><td>{esc(str(v))}</td></tr>" for k, v in (exif.items() if isinstance(exif, dict) else [])
-        ) if exif else "<tr><td colspan=2>无或读取失败</td></tr>"
-
         publish_list = "".join(
             f"<li><a href='{esc(u)}' target='_blank' rel='noopener noreferrer'>{esc(u)}</a></li>" for u in publish_urls
         ) or "<li>暂无（请在平台发布后粘贴URL）</li>"
@@ -832,15 +1325,13 @@ class EvidenceApp:
         # 生成多个股票数据的HTML表格
         stock_block = ""
         if stocks:
-            stock_rows = "".join(
-                f"<tr><td>{esc(stock_item.get('symbol',''))}</td>"
-                f"<td>{esc(stock_item.get('close',''))}</td>"
-                f"<td>{esc(stock_item.get('date',''))}</td>"
-                f"<td>{esc(stock_item.get('time',''))}</td>"
-                f"<td>{esc(stock_item.get('volume',''))}</td>"
-                f"<td><a href='{esc(stock_item.get('source',''))}' target='_blank'>数据源</a></td></tr>"
+            stock_rows = "".join([
+                _STOCK_ROW.format(
+                    esc(stock_item.get('symbol', '')), esc(stock_item.get('close', '')), esc(stock_item.get('date', '')),
+                    esc(stock_item.get('time', '')), esc(stock_item.get('volume', '')), esc(stock_item.get('source', '')),
+                )
                 for stock_item in stocks if isinstance(stock_item, dict)
-            )
+            ])
             stock_block = f"""
             <table class="table">
               <thead><tr><th>股票代码</th><th>收盘价</th><th>日期</th><th>时间</th><th>成交量</th><th>数据源</th></tr></thead>
@@ -850,43 +1341,7 @@ class EvidenceApp:
         elif stock:  # 兼容性
             stock_block = f"<p><strong>股票数据</strong>：代码: {esc(stock.get('symbol',''))}, 收盘: {esc(stock.get('close',''))}, 日期: {esc(stock.get('date',''))}, 时间: {esc(stock.get('time',''))}，来源: <a href='{esc(stock.get('source',''))}' target='_blank'>数据源</a></p>"
 
-        world_block = "" if not world else (
-            f"<p><strong>网络UTC时间</strong>：{esc(world.get('utc_datetime',''))}（来源：<a href='{esc(world.get('source',''))}' target='_blank'>worldtimeapi</a>）</p>"
-        )
-
-        return f"""
-<!DOCTYPE html>
-<html lang=zh>
-<head>
-<meta charset="utf-8" />
-<title>{esc(APP_TITLE)} - 证明报告</title>
-<style>
-body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, 'Noto Sans', 'PingFang SC', 'Microsoft YaHei', sans-serif; margin: 24px; }}
-code, pre {{ background: #f7f7f7; padding: 2px 4px; }}
-.table {{ border-collapse: collapse; width: 100%; }}
-.table th, .table td {{ border: 1px solid #ddd; padding: 8px; }}
-.section {{ margin: 18px 0; }}
-small {{ color: #666; }}
-</style>
-</head>
-<body>
-<h1>{esc(APP_TITLE)} - 证明报告</h1>
-<p><small>生成时间：{esc(meta.get('created_at') or '')}</small></p>
-<div class="section">
-  <h2>一、照片基础信息</h2>
-  <p>原始路径：<code>{esc(meta.get('photo_original_path') or '')}</code></p>
-  <p>复制路径：<code>{esc(meta.get('photo_copied_path') or '')}</code></p>
-  <p>SHA-256 摘要：<code>{esc(meta.get('sha256') or '')}</code></p>
-  {f"<p>预览：</p><img src='{esc(photo_rel)}' style='max-width:100%;border:1px solid #ddd;' />" if photo_rel else ""}
-</div>
-<div class="section">
-  <h2>二、EXIF 元数据</h2>
-  <table class="table">
-    <thead><tr><th>字段</th><th>值</th></tr></thead>
-    <tbody>{exif_rows}</tbody>
-  </table>
-</div>
-<div class="section">
+        tail_sections = f"""<div class="section">
   <h2>三、不可预测信息</h2>
   {world_block}
   {stock_block}
@@ -896,26 +1351,88 @@ small {{ color: #666; }}
   <h2>四、发布记录（外部平台）</h2>
   <ul>
     {publish_list}
-  </ul>
-  <p><small>提示：将同一图片在多平台公开发布可增强举证链。此处记录发布URL以供核验。</small></p>
+""" + _HTML_PUBLISH_NOTE
+
+    body = f"""<h1>{esc(APP_TITLE)} - 证明报告{mode}</h1>
+<p><small>生成时间：{m['created_at']}</small></p>
+<div class="section">
+  <h2>{h_photo}</h2>
+  <p>原始路径：<code>{m['photo_original_path']}</code></p>
+  <p>复制路径：<code>{m['photo_copied_path']}</code></p>
+  <p>SHA-256 摘要：<code>{m['sha256']}</code></p>
+  {f"<p>预览：</p><img src='{esc(photo_rel)}' style='max-width:100%;border:1px solid #ddd;' />" if photo_rel else ""}
 </div>
 <div class="section">
-  <h2>五、完整性与可验证性</h2>
-  <ol>
-    <li>使用 SHA-256 对图片文件取哈希，确保内容未被篡改；第三方可复算核验。</li>
-    <li>记录 EXIF 拍摄时间等元数据（若存在），结合外部公开数据佐证。</li>
-    <li>通过公开时间源与市场行情等不可预测信息，限定生成时间窗口。</li>
-    <li>可访问以上发布URL验证公开发布的时间戳。</li>
-  </ol>
+  <h2>{h_exif}</h2>
+  <table class="table">
+    <thead><tr><th>字段</th><th>值</th></tr></thead>
+    <tbody>{exif_rows}</tbody>
+  </table>
 </div>
+{tail_sections}
 <hr />
-<p><small>本报告由 {esc(meta.get('app'))} v{esc(meta.get('version'))} 自动生成。</small></p>
-</body>
-</html>
+<p><small>本报告由 {m['app']} v{m['version']} 自动生成{mode}。</small></p>
 """
+    return "".join((_HTML_HEAD, body, _HTML_TAIL))
+
+
+def _run_cli():
+    """命令行降级：支持传入图片路径生成证据包"""
+    if len(sys.argv) > 1:
+        photo = sys.argv[1]
+        if not os.path.isfile(photo):
+            sys.stderr.write(f"[失败] 找不到文件：{photo}\n")
+            return
+        # EXIF 与网络时间在后台线程获取；同时在当前线程复制图片并顺带计算哈希
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            fe = ex.submit(read_exif, photo)
+            fw = ex.submit(fetch_world_time)
+            now = datetime.now()
+            ts = now.isoformat()
+            # 打包目录
+            pkg = os.path.join(OUTPUT_DIR, f"evidence_{now.strftime('%Y%m%d_%H%M%S')}")
+            os.makedirs(pkg, exist_ok=True)
+            # 复制图片（只读取一遍原图）
+            name = safe_filename(os.path.basename(photo))
+            copied = os.path.join(pkg, name)
+            try:
+                h = copy_and_hash(photo, copied)
+            except Exception as ce:
+                sys.stderr.write(f"[警告] 复制图片失败：{ce}\n")
+                copied = None
+                h = sha256_file(photo)
+        exif, world = fe.result(), fw.result()
+        # 写元数据
+        meta = {
+            "photo_original_path": photo,
+            "photo_copied_path": copied,
+            "sha256": h,
+            "exif": exif,
+            "world_time": world,
+            "stocks": [],  # 新格式：多个股票数据
+            "stock": None,  # 兼容性：单个股票数据
+            "publish_urls": [],
+            "created_at": ts,
+            "app": APP_TITLE,
+            "version": "1.0.0"
+        }
+        meta_path = os.path.join(pkg, "evidence.json")
+        write_json(meta_path, meta)
+
+        report_path = os.path.join(pkg, "report.html")
+        write_text(report_path, render_report(meta, cli=True))
+        sys.stderr.write(f"[完成] 已生成证据包：{pkg}\n")
+        sys.stderr.write(f"[提示] 可用浏览器打开：{report_path}\n")
+    else:
+        sys.stderr.write("[用法] 命令行降级：.\\.venv\\Scripts\\python main.py \\path\\to\\photo.jpg\n")
+        sys.stderr.write("[或] 直接：python main.py \\path\\to\\photo.jpg\n")
 
 
 def main():
+    if not _load_tk():
+        sys.stderr.write("[错误] 未找到 tkinter 模块，改用命令行模式\n\n")
+        _run_cli()
+        return
     try:
         root = tk.Tk()
         app = EvidenceApp(root)
@@ -926,108 +1443,7 @@ def main():
         sys.stderr.write("  - 重新从 python.org 安装官方 Windows 安装包（含 Tcl/Tk）\n")
         sys.stderr.write("  - 或安装 Microsoft Store 版 Python 并确保包含 Tcl/Tk\n")
         sys.stderr.write("  - 若已安装，可检查环境变量 TCL_LIBRARY/TK_LIBRARY 是否指向有效目录\n\n")
-        # 命令行降级：支持传入图片路径生成证据包
-        if len(sys.argv) > 1:
-            photo = sys.argv[1]
-            if not os.path.isfile(photo):
-                sys.stderr.write(f"[失败] 找不到文件：{photo}\n")
-                return
-            # 组装数据
-            h = sha256_file(photo)
-            exif = read_exif(photo)
-            world = fetch_world_time()
-            ts = datetime.now().isoformat()
-            # 打包目录
-            ts_dir = datetime.now().strftime("%Y%m%d_%H%M%S")
-            pkg = os.path.join(OUTPUT_DIR, f"evidence_{ts_dir}")
-            os.makedirs(pkg, exist_ok=True)
-            # 复制图片
-            name = safe_filename(os.path.basename(photo))
-            copied = os.path.join(pkg, name)
-            try:
-                shutil.copy2(photo, copied)
-            except Exception as ce:
-                sys.stderr.write(f"[警告] 复制图片失败：{ce}\n")
-                copied = None
-            # 写元数据
-            meta = {
-                "photo_original_path": photo,
-                "photo_copied_path": copied,
-                "sha256": h,
-                "exif": exif,
-                "world_time": world,
-                "stocks": [],  # 新格式：多个股票数据
-                "stock": None,  # 兼容性：单个股票数据
-                "publish_urls": [],
-                "created_at": ts,
-                "app": APP_TITLE,
-                "version": "1.0.0"
-            }
-            meta_path = os.path.join(pkg, "evidence.json")
-            with open(meta_path, "w", encoding="utf-8") as f:
-                json.dump(meta, f, ensure_ascii=False, indent=2)
-
-            # 生成简化 HTML（不依赖 Tk 组件）
-            def _build_html(meta: dict) -> str:
-                def esc(s: str) -> str:
-                    return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                photo_rel = os.path.basename(meta.get("photo_copied_path") or "")
-                exif = meta.get("exif") or {}
-                world = meta.get("world_time") or {}
-                exif_rows = "".join(
-                    f"<tr><td>{esc(str(k))}</td><td>{esc(str(v))}</td></tr>" for k, v in (exif.items() if isinstance(exif, dict) else [])
-                ) if exif else "<tr><td colspan=2>无或读取失败</td></tr>"
-                world_block = "" if not world else (
-                    f"<p><strong>网络UTC时间</strong>：{esc(world.get('utc_datetime',''))}（来源：<a href='{esc(world.get('source',''))}' target='_blank'>worldtimeapi</a>）</p>"
-                )
-                return f"""
-<!DOCTYPE html>
-<html lang=zh>
-<head>
-<meta charset=\"utf-8\" />
-<title>{esc(APP_TITLE)} - 证明报告</title>
-<style>
-body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, 'Noto Sans', 'PingFang SC', 'Microsoft YaHei', sans-serif; margin: 24px; }}
-.table {{ border-collapse: collapse; width: 100%; }}
-.table th, .table td {{ border: 1px solid #ddd; padding: 8px; }}
-.section {{ margin: 18px 0; }}
-small {{ color: #666; }}
-</style>
-</head>
-<body>
-<h1>{esc(APP_TITLE)} - 证明报告（命令行模式）</h1>
-<p><small>生成时间：{esc(meta.get('created_at') or '')}</small></p>
-<div class=\"section\">
-  <h2>照片基础信息</h2>
-  <p>原始路径：<code>{esc(meta.get('photo_original_path') or '')}</code></p>
-  <p>复制路径：<code>{esc(meta.get('photo_copied_path') or '')}</code></p>
-  <p>SHA-256 摘要：<code>{esc(meta.get('sha256') or '')}</code></p>
-  {f"<p>预览：</p><img src='{esc(photo_rel)}' style='max-width:100%;border:1px solid #ddd;' />" if photo_rel else ""}
-</div>
-<div class=\"section\">
-  <h2>EXIF 元数据</h2>
-  <table class=\"table\">
-    <thead><tr><th>字段</th><th>值</th></tr></thead>
-    <tbody>{exif_rows}</tbody>
-  </table>
-</div>
-<div class=\"section\">
-  <h2>外部时间源</h2>
-  {world_block}
-</div>
-<hr />
-<p><small>本报告由 {esc(meta.get('app'))} v{esc(meta.get('version'))} 自动生成（命令行模式）。</small></p>
-</body>
-</html>
-"""
-            report_path = os.path.join(pkg, "report.html")
-            with open(report_path, "w", encoding="utf-8") as f:
-                f.write(_build_html(meta))
-            sys.stderr.write(f"[完成] 已生成证据包：{pkg}\n")
-            sys.stderr.write(f"[提示] 可用浏览器打开：{report_path}\n")
-        else:
-            sys.stderr.write("[用法] 命令行降级：.\\.venv\\Scripts\\python main.py \\path\\to\\photo.jpg\n")
-            sys.stderr.write("[或] 直接：python main.py \\path\\to\\photo.jpg\n")
+        _run_cli()
 
 
 if __name__ == "__main__":